@@ -129,6 +129,19 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Blob storage volumes, separated by os.pathsep. When set, stored files are
+# spread across these directories instead of living only under MEDIA_ROOT.
+FILE_STORAGE_VOLUMES = [path for path in os.environ.get('FILE_STORAGE_VOLUMES', '').split(os.pathsep) if path]
+FILE_STORAGE_REPLICAS = int(os.environ.get('FILE_STORAGE_REPLICAS', '1'))
+# Volumes with less free space than this are skipped for new writes
+FILE_STORAGE_MIN_FREE_BYTES = int(os.environ.get('FILE_STORAGE_MIN_FREE_BYTES', str(1024 ** 3)))
+if FILE_STORAGE_VOLUMES:
+    DEFAULT_FILE_STORAGE = 'files.storage.VolumePoolStorage'
+
+# Seconds an unreferenced stored file must stay unreferenced before the
+# garbage collector deletes it (covers uploads whose rows have not committed)
+FILE_GC_GRACE_PERIOD = int(os.environ.get('FILE_GC_GRACE_PERIOD', '3600'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -18,8 +18,15 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from files.views import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('files.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
+
+if settings.FILE_STORAGE_VOLUMES:
+    # Files are spread over several volumes, so serve them through the storage
+    urlpatterns += [path(f'{settings.MEDIA_URL.strip("/")}/<path:name>', serve_media)]
+else:
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
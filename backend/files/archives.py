@@ -0,0 +1,203 @@
+import zlib
+import struct
+import hashlib
+import logging
+import tarfile
+import zipfile
+import tempfile
+from django.core.files import File as DjangoFile
+from django.db import transaction
+from .models import ArchiveMember, File, PendingBlobDeletion
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_TYPES = ('zip', 'tar')
+
+# Member data we can hand back without unpacking anything else
+STREAMABLE_COMPRESSION = (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)
+
+COPY_CHUNK_SIZE = 64 * 1024
+
+
+def blob_name(blob_hash):
+    return f'blobs/{blob_hash[:2]}/{blob_hash[2:4]}/{blob_hash}'
+
+
+def _zip_members(f):
+    members = []
+    with zipfile.ZipFile(f) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            if info.flag_bits & 0x1 or info.compress_type not in STREAMABLE_COMPRESSION:
+                return None
+            # The local header repeats the name and has its own extra field length
+            f.seek(info.header_offset)
+            header = struct.unpack(zipfile.structFileHeader, f.read(zipfile.sizeFileHeader))
+            offset = (
+                info.header_offset + zipfile.sizeFileHeader
+                + header[zipfile._FH_FILENAME_LENGTH] + header[zipfile._FH_EXTRA_FIELD_LENGTH]
+            )
+            members.append((info.filename, info.file_size, info.compress_type, offset, info.compress_size))
+    return members
+
+
+def _tar_members(f):
+    members = []
+    with tarfile.open(fileobj=f, mode='r:') as archive:
+        for info in archive:
+            if info.issparse():
+                return None
+            if info.isreg():
+                members.append((info.name, info.size, zipfile.ZIP_STORED, info.offset_data, info.size))
+    return members
+
+
+def list_members(f, archive_format):
+    """
+    Locate every member's stored bytes inside an archive.
+
+    Returns (path, size, compression, offset, stored_size) tuples sorted by
+    offset, or None when the archive cannot be split byte-for-byte (encrypted
+    or unusually compressed zip members, sparse tar members, overlapping data).
+    """
+    try:
+        members = _zip_members(f) if archive_format == 'zip' else _tar_members(f)
+    except (zipfile.BadZipFile, tarfile.TarError, struct.error, EOFError):
+        return None
+    if members is None:
+        return None
+
+    members.sort(key=lambda member: member[3])
+    end = 0
+    for member in members:
+        if member[3] < end:
+            return None
+        end = member[3] + member[4]
+    return members
+
+
+def _copy(source, destination, length, digest=None):
+    for chunk in _iter_chunks(source, length):
+        if digest is not None:
+            digest.update(chunk)
+        destination.write(chunk)
+
+
+def expand_archive(file):
+    """
+    Split an uploaded archive into content-addressed member blobs plus a
+    skeleton holding everything between them (headers, padding, central
+    directory). Members already in the blob store are not written again.
+    Blobs hold each member's stored bytes, which a byte-exact rebuild needs,
+    so deflated members only share blobs with identically compressed copies;
+    each member's uncompressed content hash is recorded alongside.
+
+    Returns False and leaves the file untouched if it is not an archive that
+    can be split byte-for-byte.
+    """
+    if file.file_type not in ARCHIVE_TYPES or file.archive_format:
+        return False
+
+    storage = file.file.storage
+    with storage.open(file.file.name, 'rb') as f:
+        members = list_members(f, file.file_type)
+        if not members:
+            return False
+
+        rows = []
+        position = 0
+        f.seek(0)
+        with tempfile.TemporaryFile() as skeleton:
+            for index, (path, size, compression, offset, stored_size) in enumerate(members):
+                _copy(f, skeleton, offset - position)
+                with tempfile.TemporaryFile() as blob:
+                    digest = hashlib.sha256()
+                    _copy(f, blob, stored_size, digest)
+                    blob_hash = digest.hexdigest()
+                    content_hash = blob_hash
+                    if compression != zipfile.ZIP_STORED:
+                        blob.seek(0)
+                        content_hash = _content_hash(_iter_chunks(blob, None), compression)
+                    # Withdraw any pending GC deletion before relying on the blob
+                    # existing; the sweep only deletes while it holds that row
+                    PendingBlobDeletion.objects.filter(name=blob_name(blob_hash)).delete()
+                    if not storage.exists(blob_name(blob_hash)):
+                        blob.seek(0)
+                        storage.save(blob_name(blob_hash), DjangoFile(blob))
+                position = offset + stored_size
+                rows.append(ArchiveMember(
+                    archive=file,
+                    index=index,
+                    path=path,
+                    size=size,
+                    compression=compression,
+                    offset=offset,
+                    blob_hash=blob_hash,
+                    blob_size=stored_size,
+                    content_hash=content_hash,
+                ))
+            _copy(f, skeleton, None)
+
+            skeleton.seek(0)
+            skeleton_name = storage.save(f'archives/{file.hash}.skeleton', DjangoFile(skeleton))
+
+    old_name = file.file.name
+    with transaction.atomic():
+        ArchiveMember.objects.bulk_create(rows)
+        File.objects.filter(pk=file.pk).update(file=skeleton_name, archive_format=file.file_type)
+        # Imported duplicates may share the original blob; only drop it if they don't
+        if not File.objects.filter(file=old_name).exclude(pk=file.pk).exists():
+            transaction.on_commit(lambda: storage.delete(old_name))
+    file.file.name = skeleton_name
+    file.archive_format = file.file_type
+    logger.info(f"Expanded {file.name} into {len(rows)} members")
+    return True
+
+
+def iter_archive_bytes(file):
+    """Rebuild an expanded archive by interleaving its skeleton with member blobs."""
+    storage = file.file.storage
+    members = file.members.order_by('offset').values_list('offset', 'blob_hash', 'blob_size')
+    position = 0
+    with storage.open(file.file.name, 'rb') as skeleton:
+        for offset, blob_hash, blob_size in members.iterator():
+            yield from _iter_chunks(skeleton, offset - position)
+            with storage.open(blob_name(blob_hash), 'rb') as blob:
+                yield from _iter_chunks(blob, blob_size)
+            position = offset + blob_size
+        yield from _iter_chunks(skeleton, None)
+
+
+def iter_member_bytes(member, storage):
+    """Stream one member's contents, inflating deflated zip members on the fly."""
+    with storage.open(blob_name(member.blob_hash), 'rb') as blob:
+        yield from _inflate(_iter_chunks(blob, None), member.compression)
+
+
+def _inflate(chunks, compression):
+    if compression == zipfile.ZIP_DEFLATED:
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        for chunk in chunks:
+            yield decompressor.decompress(chunk)
+        yield decompressor.flush()
+    else:
+        yield from chunks
+
+
+def _content_hash(chunks, compression):
+    digest = hashlib.sha256()
+    for chunk in _inflate(chunks, compression):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _iter_chunks(source, length):
+    remaining = length
+    while remaining is None or remaining > 0:
+        chunk = source.read(COPY_CHUNK_SIZE if remaining is None else min(COPY_CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        if remaining is not None:
+            remaining -= len(chunk)
+        yield chunk
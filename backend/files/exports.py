@@ -0,0 +1,110 @@
+import csv
+from django.core.serializers.json import DjangoJSONEncoder
+from .utils import batched
+
+EXPORT_FIELDS = ['id', 'name', 'file', 'size', 'file_type', 'upload_date', 'is_duplicate', 'original_file', 'hash']
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+DEFAULT_CHUNK_SIZE = 2000
+MAX_CHUNK_SIZE = 20000
+
+
+def iter_rows(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield export rows as dicts, reading the queryset through a server-side
+    cursor so only one chunk of rows is held in memory at a time.
+    """
+    rows = queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    for row in rows:
+        yield dict(zip(EXPORT_FIELDS, row))
+
+
+def stream_ndjson(rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    encoder = DjangoJSONEncoder()
+    for batch in batched(rows, chunk_size):
+        yield ''.join(encoder.encode(row) + '\n' for row in batch)
+
+
+class _Echo:
+    """Pseudo-buffer that hands back whatever csv.writer writes to it."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for batch in batched(rows, chunk_size):
+        yield ''.join(
+            writer.writerow([
+                row['upload_date'].isoformat() if field == 'upload_date' else row[field]
+                for field in EXPORT_FIELDS
+            ])
+            for row in batch
+        )
+
+
+class _ChunkSink:
+    """Write-only file object that buffers bytes until the stream drains them."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_parquet(rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Write one Parquet row group per chunk. Requires the optional pyarrow package."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('id', pa.int64()),
+        ('name', pa.string()),
+        ('file', pa.string()),
+        ('size', pa.int64()),
+        ('file_type', pa.string()),
+        ('upload_date', pa.timestamp('us', tz='UTC')),
+        ('is_duplicate', pa.bool_()),
+        ('original_file', pa.int64()),
+        ('hash', pa.string()),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for batch in batched(rows, chunk_size):
+        writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+STREAMERS = {
+    'ndjson': stream_ndjson,
+    'csv': stream_csv,
+    'parquet': stream_parquet,
+}
@@ -0,0 +1,98 @@
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Trunc
+import hashlib
+
+DATE_INTERVALS = ('day', 'week', 'month', 'year')
+
+# Log-scale size buckets: < 1 KiB, < 4 KiB, < 16 KiB, ... < 1 TiB, and everything above
+SIZE_BUCKET_BOUNDS = [4 ** exp * 1024 for exp in range(16)]
+
+FACETS_CACHE_TIMEOUT = 60
+
+
+def facets_cache_key(filters, date_interval):
+    """
+    Cache key for one filter signature, given the list filter values in a
+    fixed order. Entries are not invalidated when files change, so with the
+    default per-process cache a facet result can be up to
+    FACETS_CACHE_TIMEOUT seconds stale.
+    """
+    signature = '&'.join(f'{name}={value}' for name, value in filters.items())
+    signature = f'{signature}&date_interval={date_interval}'
+    digest = hashlib.sha1(signature.encode()).hexdigest()
+    return f'files:facets:{digest}'
+
+
+def _size_bucket_range(index):
+    min_size = SIZE_BUCKET_BOUNDS[index - 1] if index > 0 else 0
+    max_size = SIZE_BUCKET_BOUNDS[index] if index < len(SIZE_BUCKET_BOUNDS) else None
+    return min_size, max_size
+
+
+def _bucket_filter(index):
+    min_size, max_size = _size_bucket_range(index)
+    condition = Q(size__gte=min_size)
+    if max_size is not None:
+        condition &= Q(size__lt=max_size)
+    return condition
+
+
+def _totals(row, prefix):
+    return {'count': row[f'{prefix}_count'], 'bytes': row[f'{prefix}_bytes'] or 0}
+
+
+def compute_facets(queryset, date_interval='month'):
+    """
+    Aggregate a filtered File queryset into the facets used by the file browser.
+
+    Each facet is aggregated on its own, so no query returns more groups than
+    the facet has entries: totals, the duplicate split and the size histogram
+    come from one row of conditional aggregates, file types from a GROUP BY
+    over file_type, and the date histogram from a GROUP BY over the truncated
+    upload date.
+    """
+    queryset = queryset.order_by()
+    aggregates = {'total_count': Count('id'), 'total_bytes': Sum('size')}
+    for label, is_duplicate in (('duplicate', True), ('unique', False)):
+        aggregates[f'{label}_count'] = Count('id', filter=Q(is_duplicate=is_duplicate))
+        aggregates[f'{label}_bytes'] = Sum('size', filter=Q(is_duplicate=is_duplicate))
+    for index in range(len(SIZE_BUCKET_BOUNDS) + 1):
+        aggregates[f'size{index}_count'] = Count('id', filter=_bucket_filter(index))
+        aggregates[f'size{index}_bytes'] = Sum('size', filter=_bucket_filter(index))
+    summary = queryset.aggregate(**aggregates)
+
+    size_histogram = []
+    for index in range(len(SIZE_BUCKET_BOUNDS) + 1):
+        bucket = _totals(summary, f'size{index}')
+        if bucket['count']:
+            min_size, max_size = _size_bucket_range(index)
+            size_histogram.append({'min_size': min_size, 'max_size': max_size, **bucket})
+
+    file_types = (
+        queryset.values('file_type')
+        .annotate(count=Count('id'), bytes=Sum('size'))
+        .order_by('-count', 'file_type')
+    )
+    date_buckets = (
+        queryset.annotate(period=Trunc('upload_date', date_interval))
+        .values('period')
+        .annotate(count=Count('id'), bytes=Sum('size'))
+        .order_by('period')
+    )
+
+    return {
+        'total': _totals(summary, 'total'),
+        'file_types': [
+            {'file_type': row['file_type'], 'count': row['count'], 'bytes': row['bytes'] or 0}
+            for row in file_types
+        ],
+        'size_histogram': size_histogram,
+        'upload_date_histogram': [
+            {'period': row['period'].isoformat(), 'count': row['count'], 'bytes': row['bytes'] or 0}
+            for row in date_buckets
+        ],
+        'duplicates': {
+            'duplicate': _totals(summary, 'duplicate'),
+            'unique': _totals(summary, 'unique'),
+        },
+    }
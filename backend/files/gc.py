@@ -0,0 +1,168 @@
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .archives import blob_name
+from .models import ArchiveMember, File, GarbageCollectionRun, PendingBlobDeletion
+from .utils import batched
+
+logger = logging.getLogger(__name__)
+
+# Top-level directories holding stored bytes: uploads, archive member blobs, archive skeletons
+GC_PREFIXES = ('archives', 'blobs', 'uploads')
+
+MARK_BATCH_SIZE = 500
+
+# A running run that has not saved its progress for this long is assumed dead
+RUN_LOCK_TIMEOUT = timedelta(minutes=15)
+
+
+class GarbageCollectionInProgress(Exception):
+    pass
+
+
+def iter_stored_names(storage, after=''):
+    """
+    Yield every stored name under GC_PREFIXES in path-component order,
+    starting after the given name so an interrupted sweep can resume.
+    """
+    cursor = after.split('/') if after else []
+
+    def walk(directory):
+        parts = directory.split('/')
+        if cursor and parts < cursor[:len(parts)]:
+            return
+        try:
+            directories, files = storage.listdir(directory)
+        except FileNotFoundError:
+            return
+        entries = sorted([(name, True) for name in directories] + [(name, False) for name in files])
+        for name, is_directory in entries:
+            path = f'{directory}/{name}'
+            if is_directory:
+                yield from walk(path)
+            elif not cursor or path.split('/') > cursor:
+                yield path
+
+    for prefix in GC_PREFIXES:
+        yield from walk(prefix)
+
+
+def _referenced(names):
+    """Mark: the subset of names still referenced by a file or an archive member."""
+    referenced = set(File.objects.filter(file__in=names).values_list('file', flat=True))
+    blob_hashes = {name.rsplit('/', 1)[-1] for name in names if name.startswith('blobs/')}
+    member_hashes = ArchiveMember.objects.filter(blob_hash__in=blob_hashes).values_list('blob_hash', flat=True)
+    referenced.update(blob_name(blob_hash) for blob_hash in member_hashes.distinct())
+    return referenced
+
+
+def _sweep(storage, name, cutoff):
+    """
+    Delete one condemned file, re-checking under a lock on its pending row
+    that it is still condemned and still unreferenced. Returns the bytes
+    reclaimed, or None if the file was spared.
+    """
+    with transaction.atomic():
+        condemned = PendingBlobDeletion.objects.select_for_update().filter(
+            name=name, condemned_at__lte=cutoff
+        ).first()
+        if condemned is None:
+            return None
+        condemned.delete()
+        if _referenced([name]):
+            return None
+        size = _stored_bytes(storage, name)
+        storage.delete(name)
+        return size
+
+
+def _stored_bytes(storage, name):
+    # A volume pool keeps one copy per replica and delete() removes them all
+    locate = getattr(storage, 'locate', None)
+    copies = len(locate(name)) if locate else 1
+    return storage.size(name) * max(copies, 1)
+
+
+def _start_run():
+    GarbageCollectionRun.objects.filter(
+        running=True, updated_at__lt=timezone.now() - RUN_LOCK_TIMEOUT
+    ).update(running=False)
+    previous = GarbageCollectionRun.objects.filter(running=False).order_by('-started_at', '-id').first()
+    start_after = previous.cursor if previous and not previous.complete else ''
+    try:
+        with transaction.atomic():
+            return GarbageCollectionRun.objects.create(cursor=start_after, running=True)
+    except IntegrityError:
+        raise GarbageCollectionInProgress("Another garbage collection run is in progress")
+
+
+def collect_garbage(storage=None, grace_period=None, max_files=None, max_bytes=None):
+    """
+    Run one incremental mark-and-sweep pass over stored bytes.
+
+    Each batch of stored names is checked against the database. Unreferenced
+    names are first condemned and only deleted by a later pass once
+    grace_period has elapsed and they are still unreferenced. A pass stops
+    when it has examined max_files names or reclaimed max_bytes, and the
+    next pass continues from where it stopped. Progress is saved after every
+    batch. Raises GarbageCollectionInProgress if another pass is still running.
+    """
+    storage = storage or default_storage
+    if grace_period is None:
+        grace_period = timedelta(seconds=settings.FILE_GC_GRACE_PERIOD)
+
+    run = _start_run()
+    start_after = run.cursor
+    now = timezone.now()
+    cutoff = now - grace_period
+
+    budget_exhausted = False
+    try:
+        for batch in batched(iter_stored_names(storage, start_after), MARK_BATCH_SIZE):
+            referenced = _referenced(batch)
+            pending = dict(PendingBlobDeletion.objects.filter(name__in=batch).values_list('name', 'condemned_at'))
+            condemned = []
+
+            for name in batch:
+                if (max_files is not None and run.files_scanned >= max_files) or \
+                        (max_bytes is not None and run.bytes_reclaimed >= max_bytes):
+                    budget_exhausted = True
+                    break
+                run.files_scanned += 1
+                run.cursor = name
+                if name in referenced:
+                    continue
+                if name not in pending:
+                    condemned.append(PendingBlobDeletion(name=name, condemned_at=now))
+                elif pending[name] <= cutoff:
+                    size = _sweep(storage, name, cutoff)
+                    if size is not None:
+                        run.files_deleted += 1
+                        run.bytes_reclaimed += size
+
+            # Anything referenced again since it was condemned is spared
+            resurrected = [name for name in pending if name in referenced]
+            PendingBlobDeletion.objects.filter(name__in=resurrected).delete()
+            PendingBlobDeletion.objects.bulk_create(condemned, ignore_conflicts=True)
+            run.files_condemned += len(condemned)
+            # Record progress now, so a killed run loses at most this batch
+            # and its lock goes stale after RUN_LOCK_TIMEOUT
+            run.save()
+            if budget_exhausted:
+                break
+
+        if not budget_exhausted:
+            run.complete = True
+            run.cursor = ''
+    finally:
+        run.running = False
+        run.finished_at = timezone.now()
+        run.save()
+    logger.info(
+        f"GC run {run.pk}: scanned {run.files_scanned}, condemned {run.files_condemned}, "
+        f"deleted {run.files_deleted} ({run.bytes_reclaimed} bytes)"
+    )
+    return run
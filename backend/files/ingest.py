@@ -0,0 +1,249 @@
+import os
+import errno
+import fcntl
+import shutil
+import hashlib
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from django.core.files.storage import default_storage
+from django.db import transaction
+from .models import DuplicateGroup, File, upload_path
+from .utils import batched
+
+logger = logging.getLogger(__name__)
+
+# ioctl request number for FICLONE (linux/fs.h); clones extents on btrfs, XFS, etc.
+FICLONE = 0x40049409
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+LINK_MODES = ('auto', 'reflink', 'hardlink', 'copy')
+
+
+def _scan_dir(path):
+    files, subdirs = [], []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                files.append(entry.path)
+    return files, subdirs
+
+
+def scan_tree(root, workers=8):
+    """Yield every regular file under root, listing directories in parallel."""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(_scan_dir, root)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    files, subdirs = future.result()
+                except OSError as e:
+                    logger.warning(f"Skipping unreadable directory: {e}")
+                    continue
+                yield from files
+                pending |= {pool.submit(_scan_dir, subdir) for subdir in subdirs}
+
+
+def hash_file(path):
+    file_hash = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def _reflink(source, destination):
+    with open(source, 'rb') as src, open(destination, 'xb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.remove(destination)
+            raise
+
+
+def place_blob(source, destination, mode='auto'):
+    """
+    Put source's bytes at destination without copying them when possible.
+
+    In auto mode this tries a copy-on-write reflink first, then a hardlink,
+    and only copies when neither is supported (e.g. across filesystems).
+    Returns the method that was used.
+    """
+    if mode not in LINK_MODES:
+        raise ValueError(f"Unknown link mode: {mode}")
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    attempts = [mode] if mode != 'auto' else ['reflink', 'hardlink', 'copy']
+    for method in attempts:
+        try:
+            if method == 'reflink':
+                _reflink(source, destination)
+            elif method == 'hardlink':
+                os.link(source, destination)
+            else:
+                shutil.copyfile(source, destination)
+            return method
+        except OSError as e:
+            if method == attempts[-1] or e.errno == errno.EEXIST:
+                raise
+
+
+class Checkpoint:
+    """Append-only record of the relative paths that have been imported."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.done = {line.rstrip('\n') for line in f if line.strip()}
+
+    def __contains__(self, relative_path):
+        return relative_path in self.done
+
+    def record(self, relative_paths):
+        relative_paths = list(relative_paths)
+        self.done.update(relative_paths)
+        if not self.path:
+            return
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.writelines(f"{relative_path}\n" for relative_path in relative_paths)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _hash_or_none(path):
+    # A file can vanish or be unreadable between the scan and the hash
+    try:
+        return hash_file(path)
+    except OSError as e:
+        logger.warning(f"Skipping unreadable file {path}: {e}")
+        return None
+
+
+def _skip(path, error, stats):
+    logger.warning(f"Skipping file that could not be stored {path}: {error}")
+    stats['failed'] += 1
+
+
+def _store_blob(path, file_hash, mode, stats):
+    blob = default_storage.get_available_name(
+        upload_path(File(hash=file_hash), os.path.basename(path)),
+        max_length=File._meta.get_field('file').max_length
+    )
+    # A volume pool wants the blob on every replica volume, not just one path
+    targets = getattr(default_storage, 'targets', None)
+    if targets is None:
+        destinations = [(default_storage.path(blob), None)]
+    else:
+        destinations = [(volume.storage.path(blob), volume) for volume in targets(blob)]
+
+    size = os.path.getsize(path)
+    for destination, volume in destinations:
+        method = place_blob(path, destination, mode)
+        stats[method] += 1
+        stats['bytes_placed'] += size
+        if volume is not None:
+            volume.record('write', size)
+    return blob
+
+
+def _file_row(path, blob, file_hash, original_id=None):
+    # Built directly rather than through File.save(), which costs several queries per row
+    name = os.path.basename(path)
+    return File(
+        name=name,
+        file=blob,
+        size=os.path.getsize(path),
+        file_type=os.path.splitext(name)[1][1:].lower(),
+        hash=file_hash,
+        is_duplicate=original_id is not None,
+        original_file_id=original_id,
+        source_path=path,
+    )
+
+
+def ingest_directory(root, batch_size=500, workers=None, mode='auto', checkpoint=None):
+    """
+    Import every file under root into the store.
+
+    Files are hashed in a worker pool and resolved against File.hash one
+    batch at a time. Content that is already stored is only recorded as a
+    duplicate; new content is placed under MEDIA_ROOT with place_blob(). Each
+    batch is written with bulk inserts in one transaction and then recorded
+    in the checkpoint, so an interrupted import can be resumed; files whose
+    source path is already recorded on a row are skipped too. Files that
+    cannot be read or stored are logged, counted as failed and left out of
+    the checkpoint.
+    """
+    root = os.path.abspath(root)
+    workers = workers or os.cpu_count() or 4
+    checkpoint = checkpoint or Checkpoint(None)
+    stats = {'scanned': 0, 'skipped': 0, 'imported': 0, 'duplicates': 0, 'failed': 0, 'bytes_placed': 0}
+    stats.update({method: 0 for method in LINK_MODES if method != 'auto'})
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for batch in batched(scan_tree(root, workers), batch_size):
+            stats['scanned'] += len(batch)
+            pending = [path for path in batch if os.path.relpath(path, root) not in checkpoint]
+            # A batch committed just before a crash is in the database but not the checkpoint
+            committed = set(File.objects.filter(source_path__in=pending).values_list('source_path', flat=True))
+            if committed:
+                checkpoint.record(os.path.relpath(path, root) for path in committed)
+                pending = [path for path in pending if path not in committed]
+            stats['skipped'] += len(batch) - len(pending)
+            if not pending:
+                continue
+
+            hashes = dict(zip(pending, pool.map(_hash_or_none, pending)))
+            stats['failed'] += sum(file_hash is None for file_hash in hashes.values())
+            pending = [path for path in pending if hashes[path] is not None]
+            originals = {
+                file_hash: (pk, blob, archive_format)
+                for file_hash, pk, blob, archive_format in File.objects.filter(
+                    hash__in={hashes[path] for path in pending}, is_duplicate=False
+                ).values_list('hash', 'pk', 'file', 'archive_format')
+            }
+
+            imported, duplicates = [], []
+            with transaction.atomic():
+                new_rows = {}
+                for path in pending:
+                    if hashes[path] in originals or hashes[path] in new_rows:
+                        duplicates.append(path)
+                        continue
+                    # If this copy fails, the next one with the same hash is tried as new content
+                    try:
+                        blob = _store_blob(path, hashes[path], mode, stats)
+                        new_rows[hashes[path]] = _file_row(path, blob, hashes[path])
+                    except OSError as e:
+                        _skip(path, e, stats)
+                        continue
+                    imported.append(path)
+                created = File.objects.bulk_create(new_rows.values())
+                originals.update({file.hash: (file.pk, file.file.name, '') for file in created})
+
+                rows = []
+                for path in duplicates:
+                    original_id, blob, archive_format = originals[hashes[path]]
+                    try:
+                        # An expanded archive's file is only its skeleton, so it cannot be shared
+                        if archive_format:
+                            blob = _store_blob(path, hashes[path], mode, stats)
+                        rows.append(_file_row(path, blob, hashes[path], original_id))
+                    except OSError as e:
+                        _skip(path, e, stats)
+                        continue
+                    imported.append(path)
+                File.objects.bulk_create(rows)
+                DuplicateGroup.refresh({row.hash for row in rows})
+
+            stats['imported'] += len(imported)
+            stats['duplicates'] += len(rows)
+            # Failed files stay out of the checkpoint so a rerun retries them
+            checkpoint.record(os.path.relpath(path, root) for path in imported)
+
+    return stats
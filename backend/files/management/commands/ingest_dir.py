@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from files.ingest import LINK_MODES, Checkpoint, ingest_directory
+import os
+
+
+class Command(BaseCommand):
+    help = "Import a local directory tree into the file store without going through HTTP uploads"
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help="Directory to import")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Files hashed and committed per batch (default: 500)")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Scanner and hashing threads (default: CPU count)")
+        parser.add_argument('--link-mode', choices=LINK_MODES, default='auto',
+                            help="How new blobs are placed; auto tries reflink, then hardlink, then copy")
+        parser.add_argument('--checkpoint', default=None,
+                            help="File recording imported paths; rerun with the same file to resume")
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        if not os.path.isdir(directory):
+            raise CommandError(f"Not a directory: {directory}")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        stats = ingest_directory(
+            directory,
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            mode=options['link_mode'],
+            checkpoint=Checkpoint(options['checkpoint']),
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats['imported']} of {stats['scanned']} files "
+            f"({stats['duplicates']} duplicates, {stats['skipped']} already imported)"
+        ))
+        if stats['failed']:
+            self.stdout.write(self.style.WARNING(
+                f"{stats['failed']} files could not be read or stored; rerun to retry them"
+            ))
+        self.stdout.write(
+            f"Placed {stats['bytes_placed']} bytes: {stats['reflink']} reflinked, "
+            f"{stats['hardlink']} hardlinked, {stats['copy']} copied"
+        )
@@ -0,0 +1,25 @@
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand, CommandError
+from files.storage import VolumePoolStorage, rebalance
+
+
+class Command(BaseCommand):
+    help = "Move stored files to their placement after storage volumes are added or removed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drain', action='append', default=[], metavar='PATH',
+                            help="Volume removed from FILE_STORAGE_VOLUMES whose files should be moved off (repeatable)")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report what would move without touching any files")
+
+    def handle(self, *args, **options):
+        storage = storages['default']
+        if not isinstance(storage, VolumePoolStorage):
+            raise CommandError("FILE_STORAGE_VOLUMES is not configured")
+
+        stats = rebalance(storage, drain=options['drain'], dry_run=options['dry_run'])
+        verb = "Would move" if options['dry_run'] else "Moved"
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {stats['checked']} files. {verb} {stats['bytes_moved']} bytes: "
+            f"{stats['copied']} copies made, {stats['removed']} copies removed"
+        ))
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_duplicate_groups(apps, schema_editor):
+    File = apps.get_model('files', 'File')
+    DuplicateGroup = apps.get_model('files', 'DuplicateGroup')
+
+    hashes = (
+        File.objects.exclude(hash__isnull=True)
+        .values('hash')
+        .annotate(members=models.Count('id'))
+        .filter(members__gt=1)
+        .values_list('hash', flat=True)
+    )
+    for file_hash in hashes.iterator():
+        members = list(File.objects.filter(hash=file_hash).order_by('upload_date', 'id'))
+        original = next((member for member in members if not member.is_duplicate), members[0])
+        File.objects.filter(pk=original.pk).update(is_duplicate=False, original_file=None)
+        File.objects.filter(hash=file_hash).exclude(pk=original.pk).update(is_duplicate=True, original_file=original)
+        DuplicateGroup.objects.create(
+            hash=file_hash,
+            original=original,
+            size=original.size,
+            member_count=len(members),
+            wasted_bytes=original.size * (len(members) - 1),
+        )
+
+    # Duplicates whose original was deleted under the old SET_NULL behaviour
+    File.objects.filter(is_duplicate=True, original_file__isnull=True).exclude(
+        hash__in=DuplicateGroup.objects.values('hash')
+    ).update(is_duplicate=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0003_file_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='file',
+            name='hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.CreateModel(
+            name='DuplicateGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.CharField(max_length=64, unique=True)),
+                ('size', models.BigIntegerField()),
+                ('member_count', models.PositiveIntegerField(default=2)),
+                ('wasted_bytes', models.BigIntegerField(default=0)),
+                ('original', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='files.file')),
+            ],
+            options={
+                'ordering': ['-wasted_bytes'],
+                'indexes': [models.Index(fields=['-wasted_bytes'], name='files_dupli_wasted__42dd0c_idx')],
+            },
+        ),
+        migrations.RunPython(build_duplicate_groups, migrations.RunPython.noop),
+    ]
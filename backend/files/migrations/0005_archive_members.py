@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0004_duplicate_groups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='archive_format',
+            field=models.CharField(blank=True, default='', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='ArchiveMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('path', models.CharField(max_length=1024)),
+                ('size', models.BigIntegerField()),
+                ('compression', models.PositiveSmallIntegerField(default=0)),
+                ('offset', models.BigIntegerField()),
+                ('blob_hash', models.CharField(db_index=True, max_length=64)),
+                ('blob_size', models.BigIntegerField()),
+                ('archive', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='members', to='files.file')),
+            ],
+            options={
+                'ordering': ['archive', 'index'],
+                'indexes': [models.Index(fields=['archive', 'path'], name='files_archi_archive_ff934b_idx')],
+            },
+        ),
+    ]
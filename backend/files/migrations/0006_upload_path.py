@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:25
+
+from django.db import migrations, models
+import files.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0005_archive_members'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='file',
+            name='file',
+            field=models.FileField(max_length=255, upload_to=files.models.upload_path),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0006_upload_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GarbageCollectionRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('cursor', models.CharField(blank=True, default='', max_length=255)),
+                ('complete', models.BooleanField(default=False)),
+                ('files_scanned', models.PositiveIntegerField(default=0)),
+                ('files_condemned', models.PositiveIntegerField(default=0)),
+                ('files_deleted', models.PositiveIntegerField(default=0)),
+                ('bytes_reclaimed', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PendingBlobDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('condemned_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0007_garbage_collection'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='garbagecollectionrun',
+            name='running',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddConstraint(
+            model_name='garbagecollectionrun',
+            constraint=models.UniqueConstraint(condition=models.Q(('running', True)), fields=('running',), name='files_single_running_gc_run'),
+        ),
+    ]
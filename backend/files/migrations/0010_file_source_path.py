@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0009_garbage_collection_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='source_path',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=1024),
+        ),
+    ]
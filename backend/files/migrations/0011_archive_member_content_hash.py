@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:43
+
+from django.db import migrations, models
+
+
+def backfill_stored_members(apps, schema_editor):
+    # Uncompressed members are stored as-is, so their blob hash is their content hash.
+    # Deflated members would need every blob read back and are left blank.
+    ArchiveMember = apps.get_model('files', 'ArchiveMember')
+    ArchiveMember.objects.filter(compression=0).update(content_hash=models.F('blob_hash'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0010_file_source_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivemember',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.RunPython(backfill_stored_members, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:44
+
+from django.db import migrations, models
+
+
+def demote_extra_originals(apps, schema_editor):
+    # Concurrent first uploads could each save as an original of the same hash
+    File = apps.get_model('files', 'File')
+    DuplicateGroup = apps.get_model('files', 'DuplicateGroup')
+
+    hashes = (
+        File.objects.filter(is_duplicate=False).exclude(hash__isnull=True)
+        .values('hash')
+        .annotate(originals=models.Count('id'))
+        .filter(originals__gt=1)
+        .values_list('hash', flat=True)
+    )
+    for file_hash in list(hashes):
+        original = File.objects.filter(hash=file_hash, is_duplicate=False).order_by('id').first()
+        File.objects.filter(hash=file_hash).exclude(pk=original.pk).update(is_duplicate=True, original_file=original)
+        members = File.objects.filter(hash=file_hash).count()
+        DuplicateGroup.objects.update_or_create(
+            hash=file_hash,
+            defaults={
+                'original': original,
+                'size': original.size,
+                'member_count': members,
+                'wasted_bytes': original.size * (members - 1),
+            }
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0011_archive_member_content_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(demote_extra_originals, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='file',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_duplicate', False)), fields=('hash',), name='files_single_original_per_hash'),
+        ),
+    ]
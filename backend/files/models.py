@@ -1,30 +1,34 @@
 import os
 import logging
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.core.files.storage import FileSystemStorage
-from django.db.models import Sum
+from django.db.models import Count, F, Sum
 from django.utils import timezone
 import hashlib
 
 logger = logging.getLogger(__name__)
 
+
+def upload_path(instance, filename):
+    # Keyed by content hash so storage can place every copy of it together
+    if instance.hash:
+        return f'uploads/{instance.hash[:2]}/{instance.hash}/{filename}'
+    return f'uploads/{filename}'
+
+
 class File(models.Model):
     name = models.CharField(max_length=255)
-    file = models.FileField(upload_to='uploads/')
+    file = models.FileField(upload_to=upload_path, max_length=255)
     size = models.BigIntegerField()
     file_type = models.CharField(max_length=50)
     upload_date = models.DateTimeField(auto_now_add=True)
-    hash = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)
     is_duplicate = models.BooleanField(default=False)
     original_file = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='duplicates')
-    
-    class Meta:
-        indexes = [
-            models.Index(fields=['name']),
-            models.Index(fields=['file_type']),
-            models.Index(fields=['size']),
-            models.Index(fields=['upload_date']),
-        ]
+    # Set to 'zip' or 'tar' once the archive has been split into member blobs
+    archive_format = models.CharField(max_length=10, blank=True, default='')
+    # Absolute path a bulk import read the file from, so a resumed import skips it
+    source_path = models.CharField(max_length=1024, blank=True, default='', db_index=True)
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -32,6 +36,8 @@ class File(models.Model):
             self.name = os.path.basename(self.file.name)
     
     def save(self, *args, **kwargs):
+        creating = not self.pk
+
         if not self.hash and self.file:
             # Calculate SHA-256 hash of the file
             self.file.seek(0)
@@ -41,8 +47,9 @@ class File(models.Model):
             self.hash = file_hash.hexdigest()
             self.file.seek(0)
 
-            # Check for existing files with the same hash
-            existing_file = File.objects.filter(hash=self.hash).exclude(id=self.id).first()
+        if creating and self.hash:
+            # The original is the surviving member that is not itself a duplicate
+            existing_file = File.objects.filter(hash=self.hash, is_duplicate=False).order_by('id').first()
             if existing_file:
                 self.is_duplicate = True
                 self.original_file = existing_file
@@ -50,13 +57,63 @@ class File(models.Model):
                 self.is_duplicate = False
                 self.original_file = None
 
-        if not self.pk:  # Only on creation
+        if creating:
             self.size = self.file.size
-            self.name = os.path.basename(self.file.name)
-            self.file_type = os.path.splitext(self.file.name)[1][1:].lower()
-            
-        super().save(*args, **kwargs)
-    
+            # Keep an explicit name, e.g. when several files share one stored blob
+            self.name = self.name or os.path.basename(self.file.name)
+            self.file_type = os.path.splitext(self.name)[1][1:].lower()
+
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+            except IntegrityError:
+                if not creating or self.is_duplicate or not self.hash:
+                    raise
+                # A concurrent upload of the same content became the original first
+                self.is_duplicate = True
+                self.original_file = File.objects.get(hash=self.hash, is_duplicate=False)
+                super().save(*args, **kwargs)
+            if creating and self.is_duplicate:
+                DuplicateGroup.add_member(self)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            if self.hash:
+                DuplicateGroup.remove_member(self)
+            return super().delete(*args, **kwargs)
+
+    def promote_to_original(self):
+        """Make this file the original of its hash, taking over the other duplicates."""
+        File.objects.filter(hash=self.hash).exclude(pk=self.pk).update(is_duplicate=True, original_file=self)
+        File.objects.filter(pk=self.pk).update(is_duplicate=False, original_file=None)
+        self.is_duplicate = False
+        self.original_file = None
+
+    @classmethod
+    def delete_in_batches(cls, queryset, batch_size=500):
+        """
+        Delete the rows of queryset in batches of batch_size, one transaction
+        per batch, fixing up duplicate groups for every hash touched. Stored
+        bytes are left for the garbage collector. Returns the rows deleted.
+        """
+        deleted = 0
+        last_pk = 0
+        while True:
+            batch = list(
+                queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1]
+            with transaction.atomic():
+                hashes = set(
+                    cls.objects.filter(pk__in=batch).exclude(hash__isnull=True).values_list('hash', flat=True)
+                )
+                deleted += cls.objects.filter(pk__in=batch).delete()[1].get(cls._meta.label, 0)
+                DuplicateGroup.refresh(hashes)
+        return deleted
+
     @classmethod
     def get_storage_savings(cls):
         duplicates = cls.objects.filter(is_duplicate=True)
@@ -67,4 +124,184 @@ class File(models.Model):
         return self.name
 
     class Meta:
-        ordering = ['-upload_date']
\ No newline at end of file
+        ordering = ['-upload_date']
+        indexes = [
+            models.Index(fields=['name']),
+            models.Index(fields=['file_type']),
+            models.Index(fields=['size']),
+            models.Index(fields=['upload_date']),
+        ]
+        constraints = [
+            # One original per content hash; every other copy is a duplicate of it
+            models.UniqueConstraint(
+                fields=['hash'], condition=models.Q(is_duplicate=False), name='files_single_original_per_hash'
+            ),
+        ]
+
+
+class DuplicateGroup(models.Model):
+    """
+    All files sharing one content hash, maintained incrementally as files are
+    added and removed. Only hashes with at least two members have a group.
+    """
+    hash = models.CharField(max_length=64, unique=True)
+    original = models.ForeignKey(File, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    size = models.BigIntegerField()
+    member_count = models.PositiveIntegerField(default=2)
+    wasted_bytes = models.BigIntegerField(default=0)
+
+    @classmethod
+    def add_member(cls, file):
+        group, created = cls.objects.select_for_update().get_or_create(
+            hash=file.hash,
+            defaults={
+                'original': file.original_file,
+                'size': file.size,
+                'member_count': 2,
+                'wasted_bytes': file.size,
+            }
+        )
+        if not created:
+            cls.objects.filter(pk=group.pk).update(
+                member_count=F('member_count') + 1,
+                wasted_bytes=F('wasted_bytes') + group.size,
+            )
+
+    @classmethod
+    def remove_member(cls, file):
+        """
+        Account for a file about to be deleted. When the original goes, the
+        oldest surviving duplicate is promoted so the group never dangles.
+        """
+        group = cls.objects.select_for_update().filter(hash=file.hash).first()
+        if group is None:
+            return
+
+        survivors = File.objects.filter(hash=file.hash).exclude(pk=file.pk).order_by('upload_date', 'id')
+        if not file.is_duplicate:
+            successor = survivors.first()
+            if successor is not None:
+                successor.promote_to_original()
+                group.original = successor
+
+        group.member_count -= 1
+        group.wasted_bytes = group.size * (group.member_count - 1)
+        if group.member_count < 2:
+            group.delete()
+        else:
+            group.save(update_fields=['original', 'member_count', 'wasted_bytes'])
+
+    @classmethod
+    def refresh(cls, hashes):
+        """
+        Recompute the groups for hashes after members were added or removed
+        in bulk, promoting a survivor wherever the original was removed. Runs
+        a fixed number of queries however many hashes are passed.
+        """
+        counts = dict(
+            File.objects.filter(hash__in=hashes).values('hash')
+            .annotate(members=Count('id')).values_list('hash', 'members')
+        )
+        originals = {
+            file_hash: (pk, size)
+            for file_hash, pk, size in File.objects.filter(hash__in=hashes, is_duplicate=False)
+            .values_list('hash', 'pk', 'size')
+        }
+        for file_hash in hashes:
+            if file_hash in counts and file_hash not in originals:
+                successor = File.objects.filter(hash=file_hash).order_by('upload_date', 'id').first()
+                successor.promote_to_original()
+                originals[file_hash] = (successor.pk, successor.size)
+
+        grouped = [h for h in hashes if counts.get(h, 0) >= 2]
+        cls.objects.filter(hash__in=[h for h in hashes if counts.get(h, 0) < 2]).delete()
+        existing = {group.hash: group for group in cls.objects.select_for_update().filter(hash__in=grouped)}
+        created = []
+        for file_hash in grouped:
+            original_id, size = originals[file_hash]
+            group = existing.get(file_hash) or cls(hash=file_hash, size=size)
+            group.original_id = original_id
+            group.member_count = counts[file_hash]
+            group.wasted_bytes = group.size * (group.member_count - 1)
+            if file_hash not in existing:
+                created.append(group)
+        cls.objects.bulk_update(existing.values(), ['original', 'member_count', 'wasted_bytes'])
+        cls.objects.bulk_create(created)
+
+    def __str__(self):
+        return self.hash
+
+    class Meta:
+        ordering = ['-wasted_bytes']
+        indexes = [
+            models.Index(fields=['-wasted_bytes']),
+        ]
+
+
+class ArchiveMember(models.Model):
+    """
+    One member of an expanded archive. Its stored bytes live in a
+    content-addressed blob shared by every archive containing the same data;
+    offset locates them in the original archive for byte-exact rebuilding.
+    The blob keeps the member as stored, so a deflated member is keyed by its
+    compressed bytes; content_hash is the SHA-256 of the uncompressed content
+    and matches File.hash for the same data uploaded on its own.
+    """
+    archive = models.ForeignKey(File, on_delete=models.CASCADE, related_name='members')
+    index = models.PositiveIntegerField()
+    path = models.CharField(max_length=1024)
+    size = models.BigIntegerField()
+    compression = models.PositiveSmallIntegerField(default=0)
+    offset = models.BigIntegerField()
+    blob_hash = models.CharField(max_length=64, db_index=True)
+    blob_size = models.BigIntegerField()
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
+
+    def __str__(self):
+        return self.path
+
+    class Meta:
+        ordering = ['archive', 'index']
+        indexes = [
+            models.Index(fields=['archive', 'path']),
+        ]
+
+
+class PendingBlobDeletion(models.Model):
+    """
+    A stored file the garbage collector found unreferenced. It is only
+    deleted if it is still unreferenced once the grace period has passed,
+    which protects uploads that write bytes before their row commits.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    condemned_at = models.DateTimeField()
+
+    def __str__(self):
+        return self.name
+
+
+class GarbageCollectionRun(models.Model):
+    started_at = models.DateTimeField(auto_now_add=True)
+    # Saved after every batch, so a run that stops saving has died
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Last stored name examined; the next run resumes after it unless complete
+    cursor = models.CharField(max_length=255, blank=True, default='')
+    complete = models.BooleanField(default=False)
+    # At most one run may be in progress; enforced by the constraint below
+    running = models.BooleanField(default=False)
+    files_scanned = models.PositiveIntegerField(default=0)
+    files_condemned = models.PositiveIntegerField(default=0)
+    files_deleted = models.PositiveIntegerField(default=0)
+    bytes_reclaimed = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"GC run {self.started_at:%Y-%m-%d %H:%M}: {self.bytes_reclaimed} bytes"
+
+    class Meta:
+        ordering = ['-started_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['running'], condition=models.Q(running=True), name='files_single_running_gc_run'
+            ),
+        ]
@@ -1,18 +1,30 @@
 from rest_framework import serializers
-from .models import File
+from .models import File, DuplicateGroup, ArchiveMember
+from .archives import expand_archive
+from django.urls import reverse
 
 class FileSerializer(serializers.ModelSerializer):
+    expand_archive = serializers.BooleanField(write_only=True, required=False, default=False)
+
     class Meta:
         model = File
-        fields = ['id', 'name', 'file', 'size', 'file_type', 'upload_date', 'is_duplicate', 'original_file', 'hash']
-        read_only_fields = ['id', 'name', 'size', 'file_type', 'upload_date', 'is_duplicate', 'original_file', 'hash']
+        fields = ['id', 'name', 'file', 'size', 'file_type', 'upload_date', 'is_duplicate', 'original_file', 'hash', 'archive_format', 'expand_archive']
+        read_only_fields = ['id', 'name', 'size', 'file_type', 'upload_date', 'is_duplicate', 'original_file', 'hash', 'archive_format']
 
     def create(self, validated_data):
+        expand = validated_data.pop('expand_archive', False)
         # The name will be set in the model's save() method
-        return File.objects.create(**validated_data)
+        file = File.objects.create(**validated_data)
+        if expand and not file.is_duplicate:
+            expand_archive(file)
+        return file
     
     def to_representation(self, instance):
         data = super().to_representation(instance)
+        # Expanded archives are stored as a skeleton plus member blobs, so they
+        # have to be rebuilt by the download endpoint
+        if instance.archive_format:
+            data['file'] = reverse('file-download', args=[instance.pk])
         # Ensure the file URL is absolute
         if data['file']:
             request = self.context.get('request')
@@ -24,4 +36,14 @@ class StorageStatsSerializer(serializers.Serializer):
     total_files = serializers.IntegerField()
     unique_files = serializers.IntegerField()
     duplicate_files = serializers.IntegerField()
-    storage_saved = serializers.IntegerField()
\ No newline at end of file
+    storage_saved = serializers.IntegerField()
+
+class DuplicateGroupSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DuplicateGroup
+        fields = ['id', 'hash', 'original', 'size', 'member_count', 'wasted_bytes']
+
+class ArchiveMemberSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchiveMember
+        fields = ['index', 'path', 'size', 'blob_hash', 'content_hash']
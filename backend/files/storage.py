@@ -0,0 +1,285 @@
+import os
+import re
+import bisect
+import shutil
+import hashlib
+import logging
+import threading
+from django.conf import settings
+from django.core.files import File as DjangoFile
+from django.core.files.storage import FileSystemStorage, Storage
+from django.utils.deconstruct import deconstructible
+
+logger = logging.getLogger(__name__)
+
+# Ring points for the largest volume; smaller volumes get proportionally fewer
+VIRTUAL_NODES = 128
+
+CONTENT_HASH_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+
+def placement_key(name):
+    """
+    Key a stored name by the content hash it carries (uploads, member blobs
+    and skeletons all embed File.hash or the blob hash), so every copy of the
+    same content lands on the same volumes. Other names are keyed as-is.
+    """
+    match = CONTENT_HASH_PATTERN.search(name)
+    return match.group(0) if match else name
+
+
+def _ring_point(value):
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+
+class _CountingReader:
+    """Wraps an open file and counts the bytes read through it."""
+
+    def __init__(self, file, volume):
+        self._file = file
+        self._volume = volume
+
+    def read(self, *args, **kwargs):
+        data = self._file.read(*args, **kwargs)
+        self._volume.record('read', len(data))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+
+class Volume:
+    def __init__(self, path, base_url=None):
+        self.path = os.path.abspath(path)
+        self.storage = FileSystemStorage(location=self.path, base_url=base_url)
+        self._lock = threading.Lock()
+        self.counters = {'reads': 0, 'writes': 0, 'bytes_read': 0, 'bytes_written': 0}
+
+    def record(self, operation, size):
+        with self._lock:
+            if operation == 'read':
+                self.counters['bytes_read'] += size
+            else:
+                self.counters['writes'] += 1
+                self.counters['bytes_written'] += size
+
+    def record_open(self):
+        with self._lock:
+            self.counters['reads'] += 1
+
+    def capacity_bytes(self):
+        return shutil.disk_usage(self.path).total
+
+    def free_bytes(self):
+        return shutil.disk_usage(self.path).free
+
+    def metrics(self):
+        usage = shutil.disk_usage(self.path)
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            'path': self.path,
+            'total_bytes': usage.total,
+            'used_bytes': usage.used,
+            'free_bytes': usage.free,
+            'fill_ratio': round(usage.used / usage.total, 4) if usage.total else 0,
+            **counters,
+        }
+
+
+@deconstructible
+class VolumePoolStorage(Storage):
+    """
+    Spread stored files across several mounted volumes.
+
+    Names are placed on a consistent-hash ring whose virtual nodes are
+    weighted by each volume's capacity, and written to the first `replicas`
+    distinct volumes clockwise from the key. Capacity only changes when the
+    volumes do, so every process computes the same placement. A volume with
+    less than `min_free_bytes` free is passed over for new writes, which go
+    to the next volume in ring order instead. Lookups try the ring order
+    first and fall back to the remaining volumes, so files written under an
+    older ring, or around a full volume, stay readable.
+    """
+
+    def __init__(self, volumes=None, replicas=None, base_url=None, min_free_bytes=None):
+        paths = volumes if volumes is not None else settings.FILE_STORAGE_VOLUMES
+        if not paths:
+            raise ValueError("VolumePoolStorage needs at least one volume")
+        self.base_url = base_url if base_url is not None else settings.MEDIA_URL
+        self.volumes = [Volume(path, self.base_url) for path in paths]
+        for volume in self.volumes:
+            os.makedirs(volume.path, exist_ok=True)
+        replicas = replicas if replicas is not None else getattr(settings, 'FILE_STORAGE_REPLICAS', 1)
+        self.replicas = max(1, min(replicas, len(self.volumes)))
+        self.min_free_bytes = (
+            min_free_bytes if min_free_bytes is not None
+            else getattr(settings, 'FILE_STORAGE_MIN_FREE_BYTES', 0)
+        )
+        self.build_ring()
+
+    def build_ring(self):
+        capacity = [volume.capacity_bytes() for volume in self.volumes]
+        largest = max(capacity) or 1
+        ring = []
+        for index, volume in enumerate(self.volumes):
+            nodes = max(1, round(VIRTUAL_NODES * capacity[index] / largest))
+            ring.extend((_ring_point(f'{volume.path}#{node}'), index) for node in range(nodes))
+        ring.sort()
+        self._ring = ring
+        self._points = [point for point, _ in ring]
+
+    def placement(self, name):
+        """All volumes in ring order for name; the first `replicas` hold it."""
+        start = bisect.bisect(self._points, _ring_point(placement_key(name)))
+        order = []
+        for offset in range(len(self._ring)):
+            index = self._ring[(start + offset) % len(self._ring)][1]
+            if self.volumes[index] not in order:
+                order.append(self.volumes[index])
+                if len(order) == len(self.volumes):
+                    break
+        return order
+
+    def targets(self, name):
+        """
+        The volumes that should hold name: the first `replicas` in ring order
+        with at least min_free_bytes free. If too few have room, the rest are
+        filled from the full volumes in ring order.
+        """
+        order = self.placement(name)
+        chosen = []
+        for volume in order:
+            if volume.free_bytes() >= self.min_free_bytes:
+                chosen.append(volume)
+                if len(chosen) == self.replicas:
+                    return chosen
+        return chosen + [volume for volume in order if volume not in chosen][:self.replicas - len(chosen)]
+
+    def locate(self, name):
+        return [volume for volume in self.placement(name) if volume.storage.exists(name)]
+
+    def _save(self, name, content):
+        targets = self.targets(name)
+        # The first write may move content away (temporary uploads are moved,
+        # not copied), so further replicas are copied from the stored file
+        saved_name = targets[0].storage._save(name, content)
+        size = targets[0].storage.size(saved_name)
+        targets[0].record('write', size)
+        for volume in targets[1:]:
+            _copy_between(targets[0], volume, saved_name)
+            volume.record('write', size)
+        return saved_name
+
+    def _open(self, name, mode='rb'):
+        holders = self.locate(name)
+        if not holders:
+            raise FileNotFoundError(f"{name} is not stored on any volume")
+        volume = holders[0]
+        volume.record_open()
+        file = volume.storage._open(name, mode)
+        return DjangoFile(_CountingReader(file.file, volume), name=file.name)
+
+    def path(self, name):
+        holders = self.locate(name)
+        return (holders[0] if holders else self.placement(name)[0]).storage.path(name)
+
+    def delete(self, name):
+        for volume in self.volumes:
+            volume.storage.delete(name)
+
+    def exists(self, name):
+        return any(volume.storage.exists(name) for volume in self.volumes)
+
+    def listdir(self, path):
+        directories, files = set(), set()
+        for volume in self.volumes:
+            if volume.storage.exists(path):
+                volume_directories, volume_files = volume.storage.listdir(path)
+                directories.update(volume_directories)
+                files.update(volume_files)
+        return sorted(directories), sorted(files)
+
+    def size(self, name):
+        return self._holder(name).storage.size(name)
+
+    def url(self, name):
+        return self.volumes[0].storage.url(name)
+
+    def get_accessed_time(self, name):
+        return self._holder(name).storage.get_accessed_time(name)
+
+    def get_created_time(self, name):
+        return self._holder(name).storage.get_created_time(name)
+
+    def get_modified_time(self, name):
+        return self._holder(name).storage.get_modified_time(name)
+
+    def _holder(self, name):
+        holders = self.locate(name)
+        if not holders:
+            raise FileNotFoundError(f"{name} is not stored on any volume")
+        return holders[0]
+
+    def metrics(self):
+        return [volume.metrics() for volume in self.volumes]
+
+
+def _walk(volume):
+    for directory, _, names in os.walk(volume.path):
+        for name in names:
+            yield os.path.relpath(os.path.join(directory, name), volume.path).replace(os.sep, '/')
+
+
+def _copy_between(source, destination, name):
+    target = destination.storage.path(name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    temporary = f'{target}.rebalance'
+    shutil.copy2(source.storage.path(name), temporary)
+    os.replace(temporary, target)
+
+
+def rebalance(storage, drain=(), dry_run=False):
+    """
+    Move files so each one sits on exactly its targets(): its ring placement,
+    minus any volume that has run out of headroom.
+
+    Run after adding volumes, or with `drain` listing paths of volumes that
+    have been taken out of FILE_STORAGE_VOLUMES. A file is copied to its new
+    volumes before any old copy is removed, so it stays readable throughout.
+    """
+    drained = [Volume(path) for path in drain]
+    stats = {'checked': 0, 'copied': 0, 'removed': 0, 'bytes_moved': 0}
+
+    for source in storage.volumes + drained:
+        for name in _walk(source):
+            if name.endswith('.rebalance'):
+                continue
+            holders = [volume for volume in storage.volumes + drained if volume.storage.exists(name)]
+            # Handled from the first volume holding it, unless deleted meanwhile;
+            # a file already moved onto a later volume is checked again as a no-op
+            if not holders or holders[0] is not source:
+                continue
+            stats['checked'] += 1
+
+            targets = storage.targets(name)
+            for target in targets:
+                if target in holders:
+                    continue
+                size = os.path.getsize(holders[0].storage.path(name))
+                if not dry_run:
+                    _copy_between(holders[0], target, name)
+                    target.record('write', size)
+                stats['copied'] += 1
+                stats['bytes_moved'] += size
+            for holder in holders:
+                if holder not in targets:
+                    if not dry_run:
+                        holder.storage.delete(name)
+                    stats['removed'] += 1
+
+    logger.info(f"Rebalance finished: {stats}")
+    return stats
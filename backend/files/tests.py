@@ -1,10 +1,30 @@
-from django.test import TestCase, Client
-from django.core.files.uploadedfile import SimpleUploadedFile
-from .models import File
+from django.test import TestCase, Client, override_settings
+from django.core.management import call_command
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from .models import File, DuplicateGroup, ArchiveMember, GarbageCollectionRun, PendingBlobDeletion
+from .gc import GarbageCollectionInProgress, collect_garbage, iter_stored_names
+from .archives import blob_name
+from datetime import timedelta
+from .storage import VolumePoolStorage, rebalance
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APIClient
+import csv
+import hashlib
+import importlib.util
+import io
+import json
 import os
+import shutil
+import tarfile
 import tempfile
+import zipfile
+from unittest import mock, skipUnless
 
 class FileModelTests(TestCase):
     def setUp(self):
@@ -54,6 +74,46 @@ class FileModelTests(TestCase):
         self.assertTrue(file2.is_duplicate)
         self.assertEqual(file2.original_file, file1)
 
+        group = DuplicateGroup.objects.get(hash=file1.hash)
+        self.assertEqual(group.member_count, 2)
+        self.assertEqual(group.wasted_bytes, file1.size)
+
+    def test_concurrent_first_uploads_keep_one_original(self):
+        """Test that an upload losing the race to become the original is saved as a duplicate"""
+        file1 = File.objects.create(file=SimpleUploadedFile('first.txt', b'Raced content'))
+
+        # The second upload checked for an original before the first one committed
+        with mock.patch('django.db.models.query.QuerySet.first', return_value=None):
+            file2 = File.objects.create(file=SimpleUploadedFile('second.txt', b'Raced content'))
+
+        self.assertTrue(file2.is_duplicate)
+        self.assertEqual(file2.original_file, file1)
+        self.assertEqual(File.objects.filter(hash=file1.hash, is_duplicate=False).count(), 1)
+        group = DuplicateGroup.objects.get(hash=file1.hash)
+        self.assertEqual((group.original, group.member_count), (file1, 2))
+
+    def test_original_promotion_on_delete(self):
+        """Test that deleting an original promotes the oldest surviving duplicate"""
+        files = [
+            File.objects.create(file=SimpleUploadedFile(f'copy{index}.txt', b'Shared content'))
+            for index in range(3)
+        ]
+        files[0].delete()
+
+        files[1].refresh_from_db()
+        files[2].refresh_from_db()
+        self.assertFalse(files[1].is_duplicate)
+        self.assertIsNone(files[1].original_file)
+        self.assertTrue(files[2].is_duplicate)
+        self.assertEqual(files[2].original_file, files[1])
+
+        group = DuplicateGroup.objects.get(hash=files[1].hash)
+        self.assertEqual(group.original, files[1])
+        self.assertEqual(group.member_count, 2)
+
+        files[2].delete()
+        self.assertFalse(DuplicateGroup.objects.filter(hash=files[1].hash).exists())
+
     def test_unique_file_types(self):
         """Test that file types are correctly handled"""
         # Create files with different types
@@ -122,10 +182,675 @@ class FileViewTests(TestCase):
         self.assertEqual(response.data['unique_files'], 2)
         self.assertEqual(response.data['duplicate_files'], 0)
 
+    def test_duplicate_groups_endpoint(self):
+        """Test that duplicate groups are listed by reclaimable space"""
+        File.objects.create(file=SimpleUploadedFile('copy1.txt', b'Content 1'))
+        for index in range(2):
+            File.objects.create(file=SimpleUploadedFile(f'copy{index}.pdf', b'Content 2'))
+
+        response = self.client.get(reverse('file-duplicate-groups'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total'], 2)
+        self.assertEqual(response.data['results'][0]['hash'], self.file2.hash)
+        self.assertEqual(response.data['results'][0]['member_count'], 3)
+        self.assertEqual(response.data['results'][0]['wasted_bytes'], 2 * self.file2.size)
+
     def test_file_types_endpoint(self):
         """Test the file types endpoint"""
         response = self.client.get(self.file_types_url)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.data), 2)
         self.assertIn('txt', response.data)
-        self.assertIn('pdf', response.data) 
\ No newline at end of file
+        self.assertIn('pdf', response.data) 
+
+class FileFacetsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.facets_url = reverse('file-facets')
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        cache.clear()
+
+        File.objects.create(
+            name='small.txt',
+            file=SimpleUploadedFile('small.txt', b'Small'),
+            size=5,
+            file_type='txt'
+        )
+        File.objects.create(
+            name='large.pdf',
+            file=SimpleUploadedFile('large.pdf', b'x' * 5000),
+            size=5000,
+            file_type='pdf'
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_facets_endpoint(self):
+        """Test that facets aggregate types, sizes, dates and duplicates"""
+        response = self.client.get(self.facets_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total'], {'count': 2, 'bytes': 5005})
+        self.assertEqual(
+            {entry['file_type']: entry['bytes'] for entry in response.data['file_types']},
+            {'txt': 5, 'pdf': 5000}
+        )
+        self.assertEqual(len(response.data['size_histogram']), 2)
+        self.assertEqual(response.data['size_histogram'][0]['min_size'], 0)
+        self.assertEqual(sum(entry['count'] for entry in response.data['upload_date_histogram']), 2)
+        self.assertEqual(response.data['duplicates']['unique']['count'], 2)
+        self.assertEqual(response.data['duplicates']['duplicate']['count'], 0)
+
+    def test_facets_apply_list_filters(self):
+        """Test that facets honour the same filters as the list endpoint"""
+        response = self.client.get(f'{self.facets_url}?file_type=pdf')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total']['count'], 1)
+        self.assertEqual(response.data['file_types'][0]['file_type'], 'pdf')
+
+    def test_facets_cached_per_filter_signature(self):
+        """Test that facets are served from cache until the entry expires"""
+        self.client.get(self.facets_url)
+        File.objects.create(file=SimpleUploadedFile('another.txt', b'Another'))
+
+        response = self.client.get(self.facets_url)
+        self.assertEqual(response.data['total']['count'], 2)
+        response = self.client.get(f'{self.facets_url}?file_type=txt')
+        self.assertEqual(response.data['total']['count'], 2)
+
+        cache.clear()
+        response = self.client.get(self.facets_url)
+        self.assertEqual(response.data['total']['count'], 3)
+
+    def test_facets_rejects_unknown_interval(self):
+        """Test that an unsupported date interval is rejected"""
+        response = self.client.get(f'{self.facets_url}?date_interval=decade')
+        self.assertEqual(response.status_code, 400)
+
+
+class FileExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.export_url = reverse('file-export')
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.file1 = File.objects.create(file=SimpleUploadedFile('test1.txt', b'Content 1'))
+        self.file2 = File.objects.create(file=SimpleUploadedFile('test2.pdf', b'Content 22'))
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_ndjson_export(self):
+        """Test that the catalog streams as one JSON object per line"""
+        response = self.client.get(f'{self.export_url}?file_type=txt&chunk_size=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 1)
+        row = json.loads(lines[0])
+        self.assertEqual(row['id'], self.file1.id)
+        self.assertEqual(row['hash'], self.file1.hash)
+
+    def test_csv_export(self):
+        """Test that the catalog streams as CSV with a header row"""
+        response = self.client.get(f'{self.export_url}?export_format=csv&sort=size')
+        self.assertEqual(response.status_code, 200)
+        reader = csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode()))
+        rows = list(reader)
+        self.assertEqual([row['name'] for row in rows], ['test1.txt', 'test2.pdf'])
+        self.assertEqual(rows[1]['size'], '10')
+
+    @skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow is not installed')
+    def test_parquet_export(self):
+        """Test that the catalog streams as a readable Parquet file"""
+        import pyarrow.parquet as pq
+
+        response = self.client.get(f'{self.export_url}?export_format=parquet&chunk_size=1')
+        self.assertEqual(response.status_code, 200)
+        table = pq.read_table(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(table.num_rows, 2)
+        self.assertEqual(sorted(table.column('size').to_pylist()), [9, 10])
+
+    def test_export_rejects_unknown_format(self):
+        """Test that an unsupported export format is rejected"""
+        response = self.client.get(f'{self.export_url}?export_format=xml')
+        self.assertEqual(response.status_code, 400)
+
+
+class IngestDirTests(TestCase):
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        os.makedirs(os.path.join(self.source, 'docs', 'nested'))
+        for relative_path, content in [
+            ('a.txt', b'Alpha'),
+            ('docs/b.pdf', b'Bravo'),
+            ('docs/nested/a_copy.txt', b'Alpha'),
+        ]:
+            with open(os.path.join(self.source, relative_path), 'wb') as f:
+                f.write(content)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.source)
+        shutil.rmtree(self.media_root)
+
+    def test_ingest_directory(self):
+        """Test that a directory tree is imported with duplicates sharing one blob"""
+        call_command('ingest_dir', self.source, workers=2, stdout=io.StringIO())
+
+        self.assertEqual(File.objects.count(), 3)
+        original = File.objects.get(hash=hashlib.sha256(b'Alpha').hexdigest(), is_duplicate=False)
+        duplicate = File.objects.get(hash=original.hash, is_duplicate=True)
+        self.assertEqual(duplicate.original_file, original)
+        self.assertEqual(duplicate.file.name, original.file.name)
+        self.assertEqual({original.name, duplicate.name}, {'a.txt', 'a_copy.txt'})
+        self.assertEqual(File.objects.get(name='b.pdf').file_type, 'pdf')
+
+        stored = [name for _, _, names in os.walk(self.media_root) for name in names]
+        self.assertEqual(len(stored), 2)
+        with File.objects.get(name='b.pdf').file.open('rb') as f:
+            self.assertEqual(f.read(), b'Bravo')
+
+    def test_ingest_uses_constant_queries_per_batch(self):
+        """Test that a batch is written in bulk and its duplicate groups updated once"""
+        existing = File.objects.create(file=SimpleUploadedFile('existing.txt', b'Alpha'))
+        for index in range(40):
+            with open(os.path.join(self.source, f'bulk{index}.txt'), 'wb') as f:
+                f.write(b'Bulk %d' % (index % 4))
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command('ingest_dir', self.source, link_mode='copy', stdout=io.StringIO())
+        self.assertLess(len(queries), 20)
+
+        self.assertEqual(File.objects.count(), 44)
+        group = DuplicateGroup.objects.get(hash=existing.hash)
+        self.assertEqual((group.original, group.member_count), (existing, 3))
+        self.assertEqual(File.objects.filter(hash=existing.hash, original_file=existing).count(), 2)
+        self.assertEqual(DuplicateGroup.objects.filter(member_count=10).count(), 4)
+
+    def test_ingest_resumes_from_checkpoint(self):
+        """Test that a rerun with the same checkpoint skips imported files"""
+        checkpoint = os.path.join(self.media_root, 'ingest.checkpoint')
+        call_command('ingest_dir', self.source, checkpoint=checkpoint, link_mode='copy', stdout=io.StringIO())
+        with open(os.path.join(self.source, 'c.txt'), 'wb') as f:
+            f.write(b'Charlie')
+
+        output = io.StringIO()
+        call_command('ingest_dir', self.source, checkpoint=checkpoint, link_mode='copy', stdout=output)
+        self.assertEqual(File.objects.count(), 4)
+        self.assertIn('3 already imported', output.getvalue())
+
+
+    def test_ingest_resume_after_crash_before_checkpoint(self):
+        """Test that a batch committed but not checkpointed is not imported twice"""
+        checkpoint = os.path.join(self.media_root, 'ingest.checkpoint')
+        with mock.patch('files.ingest.Checkpoint.record', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('ingest_dir', self.source, checkpoint=checkpoint, link_mode='copy', stdout=io.StringIO())
+        self.assertEqual(File.objects.count(), 3)
+
+        output = io.StringIO()
+        call_command('ingest_dir', self.source, checkpoint=checkpoint, link_mode='copy', stdout=output)
+        self.assertEqual(File.objects.count(), 3)
+        self.assertEqual(File.objects.filter(is_duplicate=True).count(), 1)
+        self.assertIn('3 already imported', output.getvalue())
+
+    def test_ingest_skips_unreadable_files(self):
+        """Test that a file failing to hash is counted and retried, not fatal to the import"""
+        from .ingest import hash_file
+        checkpoint = os.path.join(self.media_root, 'ingest.checkpoint')
+
+        def failing_hash(path):
+            if path.endswith('b.pdf'):
+                raise PermissionError(13, 'Permission denied', path)
+            return hash_file(path)
+
+        output = io.StringIO()
+        with mock.patch('files.ingest.hash_file', side_effect=failing_hash):
+            call_command('ingest_dir', self.source, checkpoint=checkpoint, link_mode='copy', stdout=output)
+        self.assertEqual(File.objects.count(), 2)
+        self.assertIn('1 files could not be read or stored', output.getvalue())
+        with open(checkpoint) as f:
+            self.assertNotIn('docs/b.pdf', f.read())
+
+        call_command('ingest_dir', self.source, checkpoint=checkpoint, link_mode='copy', stdout=io.StringIO())
+        self.assertEqual(File.objects.count(), 3)
+        self.assertTrue(File.objects.filter(name='b.pdf').exists())
+
+    def test_ingest_skips_files_that_cannot_be_stored(self):
+        """Test that a failed placement skips the file and lets its copy take over as original"""
+        from .ingest import place_blob
+        failed = []
+
+        def failing_place(source, destination, mode='auto'):
+            # The first of the two identical files vanishes before it is placed
+            if source.endswith('a.txt') and not failed:
+                failed.append(source)
+                raise FileNotFoundError(2, 'No such file or directory', source)
+            return place_blob(source, destination, mode)
+
+        with mock.patch('files.ingest.place_blob', side_effect=failing_place):
+            call_command('ingest_dir', self.source, link_mode='copy', stdout=io.StringIO())
+        self.assertEqual(File.objects.count(), 2)
+        survivor = File.objects.get(hash=hashlib.sha256(b'Alpha').hexdigest())
+        self.assertFalse(survivor.is_duplicate)
+        self.assertNotEqual(os.path.basename(failed[0]), survivor.name)
+
+class ArchiveExpansionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def make_zip(self, members):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            for path, content, compression in members:
+                archive.writestr(path, content, compress_type=compression)
+        return buffer.getvalue()
+
+    def upload(self, name, content):
+        response = self.client.post(
+            reverse('file-list'),
+            {'file': SimpleUploadedFile(name, content), 'expand_archive': 'true'},
+            format='multipart'
+        )
+        self.assertEqual(response.status_code, 201)
+        return File.objects.get(pk=response.data['id'])
+
+    def download(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_zip_expansion_round_trip(self):
+        """Test that an expanded zip downloads byte-for-byte and streams single members"""
+        shared = b'shared member ' * 1000
+        content = self.make_zip([
+            ('docs/readme.txt', b'Read me', zipfile.ZIP_STORED),
+            ('data/shared.bin', shared, zipfile.ZIP_DEFLATED),
+        ])
+        archive = self.upload('bundle.zip', content)
+        self.assertEqual(archive.archive_format, 'zip')
+
+        response = self.client.get(reverse('file-members', args=[archive.pk]))
+        self.assertEqual([member['path'] for member in response.data], ['docs/readme.txt', 'data/shared.bin'])
+
+        self.assertEqual(self.download(reverse('file-download', args=[archive.pk])), content)
+        member_url = reverse('file-member', args=[archive.pk])
+        self.assertEqual(self.download(f'{member_url}?path=data/shared.bin'), shared)
+        self.assertEqual(self.download(f'{member_url}?path=docs/readme.txt'), b'Read me')
+
+    def test_member_content_hash_matches_uploaded_file(self):
+        """Test that a deflated member records the hash of its uncompressed content"""
+        shared = b'shared member ' * 1000
+        uploaded = File.objects.create(file=SimpleUploadedFile('shared.bin', shared))
+        archive = self.upload('packed.zip', self.make_zip([
+            ('stored.bin', shared, zipfile.ZIP_STORED),
+            ('deflated.bin', shared, zipfile.ZIP_DEFLATED),
+        ]))
+
+        stored, deflated = archive.members.order_by('index')
+        self.assertEqual(stored.content_hash, uploaded.hash)
+        self.assertEqual(deflated.content_hash, uploaded.hash)
+        self.assertNotEqual(deflated.blob_hash, uploaded.hash)
+
+        response = self.client.get(reverse('file-members', args=[archive.pk]))
+        self.assertEqual({member['content_hash'] for member in response.data}, {uploaded.hash})
+
+    def test_member_filename_header_is_escaped(self):
+        """Test that uploader-controlled member names produce a valid header"""
+        archive = self.upload('names.zip', self.make_zip([('dir/a"b ü.txt', b'Quoted', zipfile.ZIP_STORED)]))
+
+        response = self.client.get(f'{reverse("file-member", args=[archive.pk])}?path=dir/a"b ü.txt')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Disposition'], "attachment; filename*=utf-8''a%22b%20%C3%BC.txt")
+        response = self.client.get(reverse('file-download', args=[archive.pk]))
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="names.zip"')
+
+    def test_members_shared_across_archives(self):
+        """Test that a member common to two archives is stored once"""
+        shared = b'x' * 10000
+        first = self.upload('first.zip', self.make_zip([('shared.bin', shared, zipfile.ZIP_STORED)]))
+        self.upload('second.zip', self.make_zip([
+            ('shared.bin', shared, zipfile.ZIP_STORED),
+            ('extra.txt', b'Extra', zipfile.ZIP_STORED),
+        ]))
+
+        blob_hash = ArchiveMember.objects.get(archive=first).blob_hash
+        self.assertEqual(ArchiveMember.objects.filter(blob_hash=blob_hash).count(), 2)
+        blobs = [name for _, _, names in os.walk(os.path.join(self.media_root, 'blobs')) for name in names]
+        self.assertEqual(len(blobs), 2)
+
+    def test_garbage_collection_during_expansion_keeps_reused_blob(self):
+        """Test that GC running mid-expansion cannot delete a member blob being reused"""
+        shared = b'shared member ' * 100
+        first = self.upload('first.zip', self.make_zip([('shared.bin', shared, zipfile.ZIP_STORED)]))
+        blob = blob_name(ArchiveMember.objects.get(archive=first).blob_hash)
+        File.delete_in_batches(File.objects.filter(pk=first.pk))
+        collect_garbage(grace_period=timedelta(0))
+        self.assertTrue(PendingBlobDeletion.objects.filter(name=blob).exists())
+
+        save = FileSystemStorage.save
+
+        def save_skeleton_during_gc(storage, name, *args, **kwargs):
+            # Members are processed, but ArchiveMember rows are not committed yet
+            if name.startswith('archives/'):
+                collect_garbage(grace_period=timedelta(0))
+            return save(storage, name, *args, **kwargs)
+
+        content = self.make_zip([('shared.bin', shared, zipfile.ZIP_STORED), ('new.txt', b'New', zipfile.ZIP_STORED)])
+        with mock.patch.object(FileSystemStorage, 'save', save_skeleton_during_gc):
+            second = self.upload('second.zip', content)
+
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, blob)))
+        self.assertEqual(self.download(reverse('file-download', args=[second.pk])), content)
+
+    def test_tar_expansion_round_trip(self):
+        """Test that an expanded tar downloads byte-for-byte"""
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w') as archive:
+            for path, data in [('a.txt', b'Alpha'), ('nested/b.txt', b'Bravo' * 300)]:
+                info = tarfile.TarInfo(path)
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+        archive = self.upload('bundle.tar', buffer.getvalue())
+
+        self.assertEqual(archive.archive_format, 'tar')
+        self.assertEqual(self.download(reverse('file-download', args=[archive.pk])), buffer.getvalue())
+
+    def test_non_archive_is_not_expanded(self):
+        """Test that expansion leaves other files untouched"""
+        file = self.upload('notes.zip', b'not really a zip')
+        self.assertEqual(file.archive_format, '')
+        self.assertFalse(file.members.exists())
+
+
+class VolumePoolStorageTests(TestCase):
+    def setUp(self):
+        self.volumes = [tempfile.mkdtemp() for _ in range(3)]
+
+    def tearDown(self):
+        for volume in self.volumes:
+            shutil.rmtree(volume)
+
+    def stored_on(self, storage, name):
+        return {volume.path for volume in storage.volumes if volume.storage.exists(name)}
+
+    def test_replicated_placement(self):
+        """Test that files are written to their ring placement with replicas"""
+        storage = VolumePoolStorage(self.volumes, replicas=2)
+        name = storage.save(f'blobs/{"ab" * 32}', ContentFile(b'Replicated'))
+
+        expected = {volume.path for volume in storage.placement(name)[:2]}
+        self.assertEqual(self.stored_on(storage, name), expected)
+        with storage.open(name) as f:
+            self.assertEqual(f.read(), b'Replicated')
+
+        metrics = {entry['path']: entry for entry in storage.metrics()}
+        self.assertEqual(sum(entry['writes'] for entry in metrics.values()), 2)
+        self.assertEqual(sum(entry['bytes_read'] for entry in metrics.values()), 10)
+
+        storage.delete(name)
+        self.assertFalse(storage.exists(name))
+
+    def test_replicas_of_temporary_upload(self):
+        """Test that a large upload moved into place is still replicated"""
+        storage = VolumePoolStorage(self.volumes, replicas=2)
+        upload = TemporaryUploadedFile('large.bin', 'application/octet-stream', 0, None)
+        upload.write(b'L' * 4096)
+        upload.seek(0)
+
+        name = storage.save(f'uploads/{"cd" * 32}/large.bin', upload)
+        self.assertEqual(len(self.stored_on(storage, name)), 2)
+        for volume in storage.placement(name)[:2]:
+            with volume.storage.open(name) as f:
+                self.assertEqual(f.read(), b'L' * 4096)
+
+    def test_garbage_collection_counts_every_replica(self):
+        """Test that reclaimed bytes include each replica the sweep removed"""
+        storage = VolumePoolStorage(self.volumes, replicas=2)
+        name = storage.save(f'blobs/ef/ef/{"ef" * 32}', ContentFile(b'Orphaned'))
+
+        collect_garbage(storage=storage, grace_period=timedelta(0))
+        run = collect_garbage(storage=storage, grace_period=timedelta(0))
+        self.assertEqual(run.files_deleted, 1)
+        self.assertEqual(run.bytes_reclaimed, 16)
+        self.assertFalse(self.stored_on(storage, name))
+
+    def test_rebalance_after_adding_and_draining_volumes(self):
+        """Test that rebalancing moves files onto the current placement"""
+        small = VolumePoolStorage(self.volumes[:1])
+        names = [small.save(f'blobs/{index:064x}', ContentFile(b'%d' % index)) for index in range(30)]
+
+        grown = VolumePoolStorage(self.volumes)
+        stats = rebalance(grown)
+        self.assertGreater(stats['copied'], 0)
+        for name in names:
+            self.assertEqual(self.stored_on(grown, name), {grown.placement(name)[0].path})
+
+        shrunk = VolumePoolStorage(self.volumes[:2])
+        rebalance(shrunk, drain=self.volumes[2:])
+        self.assertEqual(sum(len(files) for _, _, files in os.walk(self.volumes[2])), 0)
+        for index, name in enumerate(names):
+            with shrunk.open(name) as f:
+                self.assertEqual(f.read(), b'%d' % index)
+
+    def test_ingest_places_every_replica(self):
+        """Test that imported blobs land on all replica volumes and are metered"""
+        source = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source)
+        for index in range(5):
+            with open(os.path.join(source, f'file{index}.txt'), 'wb') as f:
+                f.write(b'Imported %d' % index)
+
+        with override_settings(
+            FILE_STORAGE_VOLUMES=self.volumes,
+            FILE_STORAGE_REPLICAS=2,
+            DEFAULT_FILE_STORAGE='files.storage.VolumePoolStorage'
+        ):
+            call_command('ingest_dir', source, link_mode='copy', stdout=io.StringIO())
+            storage = File._meta.get_field('file').storage
+            for file in File.objects.all():
+                self.assertEqual(self.stored_on(storage, file.file.name), {
+                    volume.path for volume in storage.targets(file.file.name)
+                })
+            self.assertEqual(sum(entry['writes'] for entry in storage.metrics()), 10)
+
+    def test_placement_ignores_free_space_drift(self):
+        """Test that placement only depends on volume capacity, not current fill"""
+        usage = shutil.disk_usage(self.volumes[0])
+        names = [f'blobs/{index:064x}' for index in range(50)]
+
+        def fill(fullest):
+            # Same capacity everywhere; one volume much fuller than the rest
+            def disk_usage(path):
+                free = usage.total // 20 if path == fullest else usage.total // 2
+                return usage._replace(used=usage.total - free, free=free)
+            return disk_usage
+
+        with mock.patch('files.storage.shutil.disk_usage', side_effect=fill(self.volumes[0])):
+            before = VolumePoolStorage(self.volumes)
+        with mock.patch('files.storage.shutil.disk_usage', side_effect=fill(self.volumes[2])):
+            after = VolumePoolStorage(self.volumes)
+
+        for name in names:
+            self.assertEqual(
+                [volume.path for volume in before.placement(name)],
+                [volume.path for volume in after.placement(name)]
+            )
+        self.assertEqual(rebalance(after)['copied'], 0)
+
+    def test_full_volume_is_passed_over(self):
+        """Test that writes skip a volume without headroom and fall back in ring order"""
+        storage = VolumePoolStorage(self.volumes, replicas=2, min_free_bytes=1024)
+        name = f'blobs/{"fe" * 32}'
+        full, second, third = storage.placement(name)
+
+        def free_bytes(volume):
+            return 0 if volume is full else 1024 ** 3
+
+        with mock.patch('files.storage.Volume.free_bytes', autospec=True, side_effect=free_bytes):
+            self.assertEqual(storage.targets(name), [second, third])
+            storage.save(name, ContentFile(b'Overflow'))
+        self.assertEqual(self.stored_on(storage, name), {second.path, third.path})
+        with storage.open(name) as f:
+            self.assertEqual(f.read(), b'Overflow')
+
+        # With every volume full, writes still go to the ring placement
+        with mock.patch('files.storage.Volume.free_bytes', return_value=0):
+            self.assertEqual(storage.targets(name), [full, second])
+
+    def test_uploads_use_volume_pool(self):
+        """Test that uploads are placed on the pool and reported per volume"""
+        with override_settings(
+            FILE_STORAGE_VOLUMES=self.volumes,
+            DEFAULT_FILE_STORAGE='files.storage.VolumePoolStorage'
+        ):
+            client = APIClient()
+            response = client.post(
+                reverse('file-list'),
+                {'file': SimpleUploadedFile('pooled.txt', b'Pooled content')},
+                format='multipart'
+            )
+            self.assertEqual(response.status_code, 201)
+            file = File.objects.get(pk=response.data['id'])
+            self.assertIn(file.hash, file.file.name)
+            self.assertEqual(len(self.stored_on(file.file.storage, file.file.name)), 1)
+
+            response = client.get(reverse('file-storage-volumes'))
+            self.assertEqual(len(response.data), 3)
+            self.assertEqual(sum(entry['bytes_written'] for entry in response.data), 14)
+
+
+class BulkDeleteTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.bulk_delete_url = reverse('file-bulk-delete')
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.original = File.objects.create(file=SimpleUploadedFile('a.txt', b'Shared'))
+        self.copies = [
+            File.objects.create(file=SimpleUploadedFile(f'a{index}.txt', b'Shared'))
+            for index in range(2)
+        ]
+        self.other = File.objects.create(file=SimpleUploadedFile('b.pdf', b'Other'))
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_bulk_delete_by_ids(self):
+        """Test that deleting an original in bulk promotes a surviving duplicate"""
+        response = self.client.post(
+            self.bulk_delete_url, {'ids': [self.original.pk, self.other.pk]}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['deleted'], 2)
+
+        survivor, duplicate = [File.objects.get(pk=copy.pk) for copy in self.copies]
+        self.assertFalse(survivor.is_duplicate)
+        self.assertEqual(duplicate.original_file, survivor)
+        group = DuplicateGroup.objects.get(hash=survivor.hash)
+        self.assertEqual((group.original, group.member_count), (survivor, 2))
+
+    def test_bulk_delete_by_filter(self):
+        """Test that the list filters select the files to delete"""
+        response = self.client.post(f'{self.bulk_delete_url}?file_type=txt')
+        self.assertEqual(response.data['deleted'], 3)
+        self.assertEqual(list(File.objects.all()), [self.other])
+        self.assertFalse(DuplicateGroup.objects.exists())
+
+    def test_bulk_delete_requires_selection(self):
+        """Test that an unfiltered bulk delete is refused"""
+        response = self.client.post(self.bulk_delete_url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(File.objects.count(), 4)
+
+    def test_garbage_collection_after_grace_period(self):
+        """Test that unreferenced bytes are condemned, then reclaimed on a later run"""
+        stored_name = self.other.file.name
+        File.delete_in_batches(File.objects.filter(pk=self.other.pk))
+
+        first = collect_garbage(grace_period=timedelta(0))
+        self.assertTrue(first.complete)
+        self.assertEqual(first.files_condemned, 1)
+        self.assertEqual(first.bytes_reclaimed, 0)
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, stored_name)))
+
+        second = collect_garbage(grace_period=timedelta(0))
+        self.assertEqual(second.files_deleted, 1)
+        self.assertEqual(second.bytes_reclaimed, 5)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, stored_name)))
+        self.assertFalse(PendingBlobDeletion.objects.exists())
+        for file in File.objects.all():
+            self.assertTrue(os.path.exists(file.file.path))
+
+    def test_garbage_collection_spares_rereferenced_files(self):
+        """Test that a condemned file referenced again before the sweep is kept"""
+        collect_garbage(grace_period=timedelta(0))
+        PendingBlobDeletion.objects.create(name=self.other.file.name, condemned_at=timezone.now() - timedelta(days=1))
+
+        run = collect_garbage(grace_period=timedelta(0))
+        self.assertEqual(run.files_deleted, 0)
+        self.assertTrue(os.path.exists(self.other.file.path))
+        self.assertFalse(PendingBlobDeletion.objects.exists())
+
+    def test_garbage_collection_resumes_within_budget(self):
+        """Test that a run stopped by its budget is continued by the next run"""
+        first = collect_garbage(max_files=3)
+        self.assertFalse(first.complete)
+        self.assertEqual(first.files_scanned, 3)
+
+        second = collect_garbage()
+        self.assertTrue(second.complete)
+        self.assertEqual(second.files_scanned, 1)
+        self.assertEqual(GarbageCollectionRun.objects.count(), 2)
+
+    def test_garbage_collection_refuses_overlapping_runs(self):
+        """Test that a run is refused while another is in progress, unless that one went stale"""
+        active = GarbageCollectionRun.objects.create(running=True)
+        with self.assertRaises(GarbageCollectionInProgress):
+            collect_garbage()
+        self.assertEqual(GarbageCollectionRun.objects.count(), 1)
+
+        # A run that stopped saving progress was killed; resume from its cursor
+        first_name = next(iter_stored_names(default_storage))
+        GarbageCollectionRun.objects.filter(pk=active.pk).update(
+            cursor=first_name, updated_at=timezone.now() - timedelta(hours=1)
+        )
+        run = collect_garbage()
+        self.assertTrue(run.complete)
+        self.assertEqual(run.files_scanned, 3)
+        self.assertFalse(GarbageCollectionRun.objects.filter(running=True).exists())
+
+    def test_garbage_collection_saves_progress_per_batch(self):
+        """Test that the cursor and counters are saved before the run finishes"""
+        saved = []
+
+        def referenced(names):
+            saved.append(GarbageCollectionRun.objects.values_list('files_scanned', 'cursor').get())
+            return set(names)
+
+        with mock.patch('files.gc.MARK_BATCH_SIZE', 1), mock.patch('files.gc._referenced', side_effect=referenced):
+            run = collect_garbage()
+        self.assertEqual([scanned for scanned, _ in saved], [0, 1, 2, 3])
+        self.assertEqual(saved[1][1], next(iter_stored_names(default_storage)))
+        self.assertEqual(run.files_scanned, 4)
@@ -3,12 +3,31 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter
-from .models import File
-from .serializers import FileSerializer, StorageStatsSerializer
+from .models import File, DuplicateGroup
+from .serializers import FileSerializer, StorageStatsSerializer, DuplicateGroupSerializer, ArchiveMemberSerializer
+from .archives import iter_archive_bytes, iter_member_bytes
+from .facets import DATE_INTERVALS, FACETS_CACHE_TIMEOUT, compute_facets, facets_cache_key
+from .exports import DEFAULT_CHUNK_SIZE, EXPORT_FORMATS, MAX_CHUNK_SIZE, STREAMERS, iter_rows
+from django.core.cache import cache
 from django.db.models import Q
 from django.db.models.functions import Lower
 from django.core.paginator import Paginator
-from django.http import JsonResponse
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.core.files.storage import default_storage
+from django.utils.http import content_disposition_header
+import mimetypes
+import os
+import importlib.util
+
+def serve_media(request, name):
+    try:
+        return FileResponse(default_storage.open(name, 'rb'))
+    except FileNotFoundError:
+        raise Http404(name)
+
+# Query parameters get_queryset filters on. Sorting and pagination are not
+# filters: they neither change which rows facets cover nor narrow a bulk delete.
+LIST_FILTER_PARAMS = ('search', 'file_type', 'min_size', 'max_size', 'start_date', 'end_date', 'hash')
 
 class FileViewSet(viewsets.ModelViewSet):
     queryset = File.objects.all()
@@ -25,6 +44,7 @@ class FileViewSet(viewsets.ModelViewSet):
         max_size = self.request.query_params.get('max_size', '')
         start_date = self.request.query_params.get('start_date', '')
         end_date = self.request.query_params.get('end_date', '')
+        file_hash = self.request.query_params.get('hash', '')
         sort_field = self.request.query_params.get('sort', '')
         sort_order = self.request.query_params.get('order', 'asc')
 
@@ -40,6 +60,8 @@ class FileViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(upload_date__gte=start_date)
         if end_date:
             queryset = queryset.filter(upload_date__lte=end_date)
+        if file_hash:
+            queryset = queryset.filter(hash=file_hash)
 
         # Handle sorting
         if sort_field:
@@ -78,6 +100,25 @@ class FileViewSet(viewsets.ModelViewSet):
             'current_page': files.number
         })
     
+    @action(detail=False, methods=['post'])
+    def bulk_delete(self, request):
+        # Either an explicit list of ids, or the list filters in the query string
+        ids = request.data.get('ids')
+        if ids is not None:
+            if not isinstance(ids, list) or not all(isinstance(pk, int) for pk in ids):
+                return Response({'error': 'ids must be a list of integers'}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = File.objects.filter(pk__in=ids)
+        elif any(request.query_params.get(param) for param in LIST_FILTER_PARAMS):
+            queryset = self.get_queryset()
+        else:
+            return Response(
+                {'error': 'Provide ids or at least one filter; refusing to delete every file'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        deleted = File.delete_in_batches(queryset)
+        return Response({'deleted': deleted})
+
     @action(detail=False, methods=['get'])
     def stats(self, request):
         total_files = File.objects.count()
@@ -92,8 +133,113 @@ class FileViewSet(viewsets.ModelViewSet):
             'storage_saved': storage_saved
         })
     
+    @action(detail=False, methods=['get'])
+    def duplicate_groups(self, request):
+        # Sorted by reclaimable space; served straight from the wasted_bytes index
+        queryset = DuplicateGroup.objects.order_by('-wasted_bytes', 'id')
+        page = request.query_params.get('page', 1)
+        per_page = request.query_params.get('per_page', 10)
+
+        paginator = Paginator(queryset, per_page)
+        try:
+            groups = paginator.page(page)
+        except:
+            groups = paginator.page(1)
+
+        serializer = DuplicateGroupSerializer(groups, many=True)
+        return Response({
+            'results': serializer.data,
+            'total': paginator.count,
+            'pages': paginator.num_pages,
+            'current_page': groups.number
+        })
+
+    @action(detail=False, methods=['get'])
+    def storage_volumes(self, request):
+        # Per-volume fill and I/O counters; empty when using a single MEDIA_ROOT
+        metrics = getattr(default_storage, 'metrics', None)
+        return Response(metrics() if metrics else [])
+
     @action(detail=False, methods=['get'])
     def file_types(self, request):
         # Get all file types and convert to set to get unique values
         file_types = set(File.objects.values_list('file_type', flat=True))
-        return Response(sorted(list(file_types)))  # Sort the list for consistent order
\ No newline at end of file
+        return Response(sorted(list(file_types)))  # Sort the list for consistent order
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        date_interval = request.query_params.get('date_interval', 'month')
+        if date_interval not in DATE_INTERVALS:
+            return Response(
+                {'error': f'date_interval must be one of: {", ".join(DATE_INTERVALS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        filters = {name: request.query_params.get(name, '') for name in LIST_FILTER_PARAMS}
+        cache_key = facets_cache_key(filters, date_interval)
+        facets = cache.get(cache_key)
+        if facets is None:
+            facets = compute_facets(self.get_queryset(), date_interval)
+            cache.set(cache_key, facets, FACETS_CACHE_TIMEOUT)
+        return Response(facets)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        # Not called `format`: DRF reserves that parameter for renderer selection
+        export_format = request.query_params.get('export_format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'error': f'export_format must be one of: {", ".join(EXPORT_FORMATS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if export_format == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+            return Response(
+                {'error': 'Parquet export requires the pyarrow package'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            chunk_size = min(int(request.query_params.get('chunk_size', DEFAULT_CHUNK_SIZE)), MAX_CHUNK_SIZE)
+        except ValueError:
+            chunk_size = DEFAULT_CHUNK_SIZE
+        chunk_size = max(chunk_size, 1)
+
+        content_type, extension = EXPORT_FORMATS[export_format]
+        rows = iter_rows(self.get_queryset(), chunk_size)
+        response = StreamingHttpResponse(
+            STREAMERS[export_format](rows, chunk_size),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = content_disposition_header(True, f'files.{extension}')
+        return response
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        file = self.get_object()
+        if not file.archive_format:
+            return FileResponse(file.file.open('rb'), as_attachment=True, filename=file.name)
+
+        response = StreamingHttpResponse(iter_archive_bytes(file), content_type='application/octet-stream')
+        response['Content-Length'] = file.size
+        response['Content-Disposition'] = content_disposition_header(True, file.name)
+        return response
+
+    @action(detail=True, methods=['get'])
+    def members(self, request, pk=None):
+        file = self.get_object()
+        serializer = ArchiveMemberSerializer(file.members.all(), many=True)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def member(self, request, pk=None):
+        file = self.get_object()
+        path = request.query_params.get('path', '')
+        member = file.members.filter(path=path).order_by('index').first()
+        if member is None:
+            return Response({'error': 'Archive member not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        content_type = mimetypes.guess_type(member.path)[0] or 'application/octet-stream'
+        response = StreamingHttpResponse(iter_member_bytes(member, file.file.storage), content_type=content_type)
+        response['Content-Length'] = member.size
+        response['Content-Disposition'] = content_disposition_header(True, os.path.basename(member.path))
+        return response
@@ -1,5 +1,5 @@
 import axios from 'axios';
-import { FileResponse, StorageStats, FileFilters } from '../types/file';
+import { FileResponse, StorageStats, FileFilters, FileFacets, DuplicateGroup, ArchiveMember } from '../types/file';
 
 const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000/api';
 
@@ -10,9 +10,10 @@ export interface PaginatedResponse<T> {
   current_page: number;
 }
 
-export const uploadFile = async (file: File): Promise<FileResponse> => {
+export const uploadFile = async (file: File, expandArchive: boolean = false): Promise<FileResponse> => {
   const formData = new FormData();
   formData.append('file', file);
+  if (expandArchive) formData.append('expand_archive', 'true');
   
   const response = await axios.post<FileResponse>(`${API_URL}/files/`, formData, {
     headers: {
@@ -54,10 +55,49 @@ export const getFileTypes = async (): Promise<string[]> => {
   return response.data;
 };
 
+export const getFileFacets = async (
+  filters: FileFilters,
+  dateInterval: 'day' | 'week' | 'month' | 'year' = 'month'
+): Promise<FileFacets> => {
+  const params = new URLSearchParams();
+  if (filters.search) params.append('search', filters.search);
+  if (filters.fileType) params.append('file_type', filters.fileType);
+  if (filters.minSize) params.append('min_size', filters.minSize.toString());
+  if (filters.maxSize) params.append('max_size', filters.maxSize.toString());
+  if (filters.startDate) params.append('start_date', filters.startDate);
+  if (filters.endDate) params.append('end_date', filters.endDate);
+  params.append('date_interval', dateInterval);
+
+  const response = await axios.get<FileFacets>(`${API_URL}/files/facets/?${params}`);
+  return response.data;
+};
+
+export const getDuplicateGroups = async (
+  page: number = 1,
+  perPage: number = 10
+): Promise<PaginatedResponse<DuplicateGroup>> => {
+  const params = new URLSearchParams();
+  params.append('page', page.toString());
+  params.append('per_page', perPage.toString());
+
+  const response = await axios.get<PaginatedResponse<DuplicateGroup>>(`${API_URL}/files/duplicate_groups/?${params}`);
+  return response.data;
+};
+
+export const getArchiveMembers = async (id: number): Promise<ArchiveMember[]> => {
+  const response = await axios.get<ArchiveMember[]>(`${API_URL}/files/${id}/members/`);
+  return response.data;
+};
+
 export const deleteFile = async (id: number): Promise<void> => {
   await axios.delete(`${API_URL}/files/${id}/`);
 };
 
+export const deleteFiles = async (ids: number[]): Promise<number> => {
+  const response = await axios.post<{ deleted: number }>(`${API_URL}/files/bulk_delete/`, { ids });
+  return response.data.deleted;
+};
+
 export const getStorageStats = async (): Promise<StorageStats> => {
   const response = await axios.get<StorageStats>(`${API_URL}/files/stats/`);
   return response.data;
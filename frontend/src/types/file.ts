@@ -7,6 +7,15 @@ export interface FileResponse {
   is_duplicate: boolean;
   original_file?: number;
   hash?: string;
+  archive_format?: string;
+}
+
+export interface ArchiveMember {
+  index: number;
+  path: string;
+  size: number;
+  blob_hash: string;
+  content_hash: string;
 }
 
 export interface StorageStats {
@@ -16,6 +25,31 @@ export interface StorageStats {
   storage_saved: number;
 }
 
+export interface DuplicateGroup {
+  id: number;
+  hash: string;
+  original: number | null;
+  size: number;
+  member_count: number;
+  wasted_bytes: number;
+}
+
+export interface FacetBucket {
+  count: number;
+  bytes: number;
+}
+
+export interface FileFacets {
+  total: FacetBucket;
+  file_types: (FacetBucket & { file_type: string })[];
+  size_histogram: (FacetBucket & { min_size: number; max_size: number | null })[];
+  upload_date_histogram: (FacetBucket & { period: string })[];
+  duplicates: {
+    duplicate: FacetBucket;
+    unique: FacetBucket;
+  };
+}
+
 export interface FileFilters {
   search?: string;
   fileType?: string;